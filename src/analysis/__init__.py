@@ -1,195 +1,1028 @@
 
 
 import os
+import argparse
+import ctypes
+from multiprocessing import get_context
 import rasterio
+from rasterio.enums import Resampling
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from datetime import datetime
-import glob
+import re
+import shutil
+import tempfile
 from pathlib import Path
+from collections import namedtuple
+from dataclasses import dataclass, field
+from functools import cached_property, partial
+from typing import Callable
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
-def load_images_from_directory(directory):
+try:
+    from numba import njit, prange, set_num_threads
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Optional ahead-of-time compiled kernels, build them with build_aot.py
+try:
+    from .diffstats_aot import diff_f32 as _diff_f32_aot, diff_u16 as _diff_u16_aot
+    AOT_AVAILABLE = True
+except ImportError:
+    AOT_AVAILABLE = False
+
+# CuPy is only used when a CUDA device is actually present
+try:
+    import cupy
+    import cupyx
+    CUPY_AVAILABLE = cupy.cuda.runtime.getDeviceCount() > 0
+except Exception:
+    CUPY_AVAILABLE = False
+
+# Let LLVM reorder the float reductions so they vectorize, but keep the NaN and
+# infinity semantics that rasters with nodata pixels rely on
+_FASTMATH = {'reassoc', 'contract', 'arcp', 'nsz'}
+
+# Optional C version of the fused difference kernel for machines without numba,
+# build it from diffstats.c as described at the top of that file
+try:
+    _diffstats_lib = ctypes.CDLL(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'libdiffstats.so'))
+    _float_array = np.ctypeslib.ndpointer(dtype=np.float32, flags='C_CONTIGUOUS')
+    _diffstats_lib.diffstats.argtypes = [
+        _float_array, _float_array, _float_array, _float_array, ctypes.c_size_t,
+        ctypes.POINTER(ctypes.c_double), ctypes.POINTER(ctypes.c_float)
+    ]
+    _diffstats_lib.diffstats.restype = None
+except OSError:
+    _diffstats_lib = None
+
+# A dated image file, data is None until the pixels have been read
+ImageRecord = namedtuple('ImageRecord', ['date', 'path', 'data', 'metadata'])
+
+# Dates in filenames, either YYYYMMDD or YYYY-MM-DD, not part of a longer digit run
+_DATE_RE = re.compile(r'(?<!\d)(?:(?P<ymd>\d{8})|(?P<dash>\d{4}-\d{2}-\d{2}))(?!\d)')
+
+def _extract_date(entry):
     """
-    Load all TIFF images from a directory and sort them by date
-    Returns a dictionary with dates as keys and loaded images as values
+    Extract the acquisition date of a TIFF file from its name
+    Falls back to the file creation time when no date is found
     """
-    images = {}
+    # Extract date from filename - assuming date is in the filename
+    # This pattern extraction needs to be adjusted based on your actual filename format
+    filename = Path(entry.name).stem
     
-    # Find all tiff files in the directory
-    tiff_files = glob.glob(os.path.join(directory, "*.tif")) + glob.glob(os.path.join(directory, "*.tiff"))
+    # Try to find date in filename (adjust the format as needed)
+    # Common formats: YYYY-MM-DD, YYYYMMDD - the first one that parses wins
+    for match in _DATE_RE.finditer(filename):
+        try:
+            if match.group('ymd'):
+                return datetime.strptime(match.group('ymd'), '%Y%m%d')
+            return datetime.strptime(match.group('dash'), '%Y-%m-%d')
+        except ValueError as e:
+            print(f"Error extracting date from {filename}: {e}")
     
-    if not tiff_files:
+    # If no date found in the filename, use the file creation time
+    print(f"Could not extract date from filename {filename}, using file creation time instead")
+    return datetime.fromtimestamp(entry.stat().st_ctime)
+
+def _scan_directory(directory):
+    """
+    Find all TIFF files in a directory
+    Returns a list of (date, file path) tuples sorted by date
+    """
+    # scandir caches the stat result needed for the creation time fallback
+    # Hidden files such as macOS ._ resource forks are skipped like glob does,
+    # a missing directory is reported the same way as an empty one
+    try:
+        with os.scandir(directory) as entries:
+            tiff_entries = [
+                entry for entry in entries
+                if not entry.name.startswith('.') and entry.is_file()
+                and entry.name.endswith(('.tif', '.tiff'))
+            ]
+    except FileNotFoundError:
+        tiff_entries = []
+
+    if not tiff_entries:
         print(f"No TIFF files found in {directory}")
-        return images
+        return []
     
-    print(f"Found {len(tiff_files)} TIFF files")
+    print(f"Found {len(tiff_entries)} TIFF files")
     
-    for tiff_file in tiff_files:
+    return sorted(((_extract_date(entry), entry.path) for entry in tiff_entries), key=itemgetter(0))
 
-        # Extract date from filename - assuming date is in the filename
-        # This pattern extraction needs to be adjusted based on your actual filename format
-        filename = Path(tiff_file).stem
+def _read_metadata(src, bands=None, decimation=1, cache=False):
+    """
+    Collect the metadata of an open rasterio dataset
+    Width, height and transform describe the grid read with the given decimation
+    """
+    height, width = src.height, src.width
+    transform = src.transform
+    if decimation > 1:
+        height, width = max(1, height // decimation), max(1, width // decimation)
+        # Scale the transform so the metadata matches the decimated pixels
+        transform = transform * transform.scale(src.width / width, src.height / height)
+    
+    return {
+        'transform': transform,
+        'crs': src.crs,
+        'bounds': src.bounds,
+        'width': width,
+        'height': height,
+        'count': src.count,  # Number of bands
+        'bands': bands,  # Bands that are read, None for all of them
+        'decimation': decimation,
+        'cache': cache,
+        'file_path': src.name
+    }
+
+def _cache_path(tiff_file, bands=None, decimation=1):
+    """
+    Path of the raw array cache kept next to a TIFF file
+    """
+    band_key = '-'.join(str(band) for band in bands) if bands else 'all'
+    return f"{tiff_file}.bands{band_key}.x{decimation}.npy"
+
+def _read_shape(metadata):
+    """
+    Shape of the array that is read for an image, (bands, height, width)
+    """
+    band_count = len(metadata['bands']) if metadata['bands'] else metadata['count']
+    return (band_count, metadata['height'], metadata['width'])
+
+def _source_stamp(tiff_file):
+    """
+    Size and modification time of a TIFF file, a cache is only used while they match
+    An older cache is not enough, cp -p, rsync -t or unzipping keep the source mtime
+    """
+    stat = os.stat(tiff_file)
+    return f"{stat.st_size} {stat.st_mtime_ns}"
+
+def _replace_file(target_file, write):
+    """
+    Write a file through a temporary file, the rename keeps concurrent readers
+    from ever seeing a partly written file
+    """
+    tmp_file = f"{target_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'wb') as f:
+            write(f)
+        os.replace(tmp_file, target_file)
+    except OSError:
+        # Do not leave a partly written file behind, e.g. when the disk is full
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+def _write_cache(cache_file, image_data, stamp):
+    """
+    Save an array for memory-mapped reads along with the stamp of its source file
+    The stamp is written last, so a cache without a matching stamp is never used
+    """
+    _replace_file(cache_file, lambda f: np.save(f, image_data))
+    _replace_file(f"{cache_file}.source", lambda f: f.write(stamp.encode()))
+
+def _load_cache(cache_file, stamp, shape, dtype):
+    """
+    Memory-map a cache written by _write_cache
+    Returns None when it is missing, was written for another version of the
+    source file or does not match the shape and dtype given by the header
+    """
+    try:
+        with open(f"{cache_file}.source", 'rb') as f:
+            if f.read().decode() != stamp:
+                return None
+        image_data = np.load(cache_file, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    
+    if image_data.shape != shape or image_data.dtype != dtype:
+        return None
+    return image_data
+
+def _read_image(tiff_file, bands=None, decimation=1, cache=False):
+    """
+    Read the bands of a TIFF file along with its metadata
+    The data is always (bands, height, width), bands=None reads every band as the
+    change metrics use them all, a list of band indexes reads only those
+    With decimation > 1 the bands are read at 1/decimation of their resolution,
+    GDAL serves this from the closest stored overview when the file has them
+    With cache the decoded bands are saved once as a .npy file next to the TIFF and
+    returned as a read-only memory map, so later runs skip decompression and
+    are served from the OS page cache
+    """
+    # sharing=False gives each worker thread its own GDAL dataset handle,
+    # rasterio releases the GIL while reading so threads overlap the I/O
+    with rasterio.open(tiff_file, sharing=False) as src:
+        metadata = _read_metadata(src, bands, decimation, cache)
         
-        # Try to find date in filename (adjust the format as needed)
+        # The stamp is taken before the pixels are read, so a file that changes
+        # while being read does not match its cache afterwards
+        if cache:
+            cache_file = _cache_path(tiff_file, bands, decimation)
+            stamp = _source_stamp(tiff_file)
+            dtype = np.dtype(src.dtypes[(bands[0] if bands else 1) - 1])
+            image_data = _load_cache(cache_file, stamp, _read_shape(metadata), dtype)
+            if image_data is not None:
+                return image_data, metadata
+        
+        # Read in the native dtype so integer rasters are not widened on read
+        if decimation > 1:
+            image_data = src.read(
+                bands, out_shape=_read_shape(metadata), resampling=Resampling.average
+            )
+        else:
+            image_data = src.read(bands)
+
+    if cache:
+        # The cache is only an optimisation, a read-only data directory or a
+        # full disk must not lose the image that was just decoded
         try:
-            # Attempt to extract date from the filename
-            # Common formats: YYYY-MM-DD, YYYYMMDD, YYYY_MM_DD
-            # This is a simplified approach - adjust based on your actual naming convention
-            parts = filename.split('_')
-            for part in parts:
-                if len(part) == 8 and part.isdigit():  # YYYYMMDD format
-                    date_str = part
-                    date_obj = datetime.strptime(date_str, '%Y%m%d')
-                    break
-                elif len(part) == 10 and part.count('-') == 2:  # YYYY-MM-DD format
-                    date_str = part
-                    date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-                    break
-            else:
-                # If no date found in parts, use the file creation time
-                date_obj = datetime.fromtimestamp(os.path.getctime(tiff_file))
-                print(f"Could not extract date from filename {filename}, using file creation time instead")
+            _write_cache(cache_file, image_data, stamp)
+        except OSError as e:
+            print(f"Warning: could not write cache {cache_file}: {e}")
+        else:
+            image_data = np.load(cache_file, mmap_mode='r')
+
+    return image_data, metadata
+
+def iter_images_sorted(directory, bands=None, decimation=1, cache=False):
+    """
+    Iterate over the TIFF images of a directory in chronological order
+    Yields ImageRecord tuples without data, only the headers are read,
+    pass the result to compare_images to stream the pixels one image at a time
+    With cache the pixels are later read through memory-mapped .npy caches
+    """
+    for date_obj, tiff_file in _scan_directory(directory):
+        try:
+            with rasterio.open(tiff_file) as src:
+                metadata = _read_metadata(src, bands, decimation, cache)
         except Exception as e:
-            print(f"Error extracting date from {filename}: {e}")
-            # Fallback to file creation time if date extraction fails
-            date_obj = datetime.fromtimestamp(os.path.getctime(tiff_file))
+            print(f"Error loading {tiff_file}: {e}")
+            continue
         
-        date_str = date_obj.strftime('%Y-%m-%d')
+        yield ImageRecord(date_obj, tiff_file, None, metadata)
+
+def load_images_from_directory(directory, bands=None, max_workers=None, decimation=1, cache=False):
+    """
+    Load all TIFF images from a directory and sort them by date
+    All bands are read unless bands lists the ones to keep, files are read in parallel threads
+    Use decimation > 1 for visualization-scale reads, keep 1 for analysis
+    With cache the images are memory maps of .npy caches next to the TIFFs
+    Returns a list of ImageRecord tuples sorted by date
+    """
+    dated_files = _scan_directory(directory)
+    if not dated_files:
+        return []
+    
+    # Keep the slots in date order, the threads finish in any order
+    images = [None] * len(dated_files)
+    
+    # Load the images using rasterio, one thread per file
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_read_image, tiff_file, bands, decimation, cache): i
+            for i, (date_obj, tiff_file) in enumerate(dated_files)
+        }
         
-        # Load the image using rasterio
-        try:
-            with rasterio.open(tiff_file) as src:
-                # Read the image data
-                image_data = src.read()
-                
-                # Store metadata for later use
-                metadata = {
-                    'transform': src.transform,
-                    'crs': src.crs,
-                    'bounds': src.bounds,
-                    'width': src.width,
-                    'height': src.height,
-                    'count': src.count,  # Number of bands
-                    'file_path': tiff_file
-                }
+        for future in as_completed(futures):
+            i = futures[future]
+            date_obj, tiff_file = dated_files[i]
+            try:
+                image_data, metadata = future.result()
                 
                 # Store both the image data and metadata
-                images[date_str] = {
-                    'data': image_data,
-                    'metadata': metadata
-                }
+                images[i] = ImageRecord(date_obj, tiff_file, image_data, metadata)
                 
-                print(f"Loaded image for date {date_str} with shape {image_data.shape}")
+                print(f"Loaded image for date {date_obj:%Y-%m-%d} with shape {image_data.shape}")
+            except Exception as e:
+                print(f"Error loading {tiff_file}: {e}")
+    
+    return [record for record in images if record is not None]
+
+def _record_shape(record):
+    """
+    Shape of the image of a record, taken from its header when it has no data yet
+    """
+    return record.data.shape if record.data is not None else _read_shape(record.metadata)
+
+def _iter_image_data(records):
+    """
+    Yield (date string, image data, reload function) for date sorted records
+    Records without data, as from iter_images_sorted, are only read when reached
+    The reload function returns the image data again without keeping it alive
+    An image whose shape matches neither neighbour cannot be part of any comparison,
+    it is yielded with None for the data and reload function and never read,
+    the mismatches of its pairs are reported here
+    """
+    records = list(records)
+    shapes = [_record_shape(record) for record in records]
+    skipped = [
+        shape not in shapes[max(i - 1, 0):i] + shapes[i + 1:i + 2]
+        for i, shape in enumerate(shapes)
+    ]
+    
+    for i, record in enumerate(records):
+        date_str = record.date.strftime('%Y-%m-%d')
+        
+        if i > 0 and (skipped[i - 1] or skipped[i]):
+            _warn_shape_mismatch(
+                records[i - 1].date.strftime('%Y-%m-%d'), date_str, shapes[i - 1], shapes[i]
+            )
+        if skipped[i]:
+            yield date_str, None, None
+            continue
+        
+        if record.data is not None:
+            yield date_str, record.data, lambda image_data=record.data: image_data
+            continue
+        
+        reload = partial(_read_image_data, record.path, record.metadata)
+        try:
+            image_data = reload()
         except Exception as e:
-            print(f"Error loading {tiff_file}: {e}")
+            print(f"Error loading {record.path}: {e}")
+            continue
+        
+        print(f"Loaded image for date {date_str} with shape {image_data.shape}")
+        yield date_str, image_data, reload
+
+def _read_image_data(tiff_file, metadata):
+    """
+    Read the bands of a TIFF file again, as described by its metadata
+    """
+    return _read_image(tiff_file, metadata['bands'], metadata['decimation'], metadata['cache'])[0]
+
+def _diff_stats_numpy(image1, image2, difference, abs_difference):
+    """
+    Plain numpy fallback for _diff_stats, one pass over the rasters per operation
+    """
+    np.subtract(image2, image1, out=difference, dtype=difference.dtype)
+    np.abs(difference, out=abs_difference)
     
-    return images
+    # Accumulate straight into float64 instead of summing in the raster dtype,
+    # callers derive the mean from the total so there is no separate mean pass
+    total = abs_difference.sum(dtype=np.float64)
+    maximum = abs_difference.max()
+    return float(total), float(maximum), abs_difference.size
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=_FASTMATH, cache=True)
+    def _diff_stats_numba(image1, image2, difference, abs_difference):
+        """
+        Fused kernel, rows are split across threads and every pixel is read and written once
+        Row partials stay in the raster dtype so the inner loop runs on float32 lanes,
+        only the per row results are accumulated in float64
+        A NaN pixel makes the maximum NaN, as with numpy, the builtin max would skip it
+        """
+        rows, cols = image1.shape
+        total = 0.0
+        # Only += and max() are reductions prange understands, the NaN aware
+        # maximum is kept per row and reduced after the parallel loop
+        row_maxima = np.empty(rows, dtype=abs_difference.dtype)
+        for i in prange(rows):
+            row_total = abs_difference.dtype.type(0)
+            row_max = abs_difference.dtype.type(0)
+            for j in range(cols):
+                # Read back through the output dtype, numba subtracts unsigned
+                # integers as unsigned so uint16 inputs would wrap around
+                difference[i, j] = image2[i, j] - image1[i, j]
+                d = difference[i, j]
+                ad = abs(d)
+                abs_difference[i, j] = ad
+                row_total += ad
+                if ad > row_max or ad != ad:
+                    row_max = ad
+            total += row_total
+            row_maxima[i] = row_max
+        
+        maximum = 0.0
+        for i in range(rows):
+            if row_maxima[i] > maximum or row_maxima[i] != row_maxima[i]:
+                maximum = row_maxima[i]
+        return total, maximum, rows * cols
 
-def compare_images(image_dict):
+def _diff_stats_c(image1, image2, difference, abs_difference):
     """
-    Compare loaded images to detect changes over time
+    C fallback for _diff_stats, vectorized with AVX2 when built with -mavx2
     """
-    if len(image_dict) < 2:
-        print("Need at least two images to compare")
-        return
+    total = ctypes.c_double()
+    maximum = ctypes.c_float()
+    _diffstats_lib.diffstats(
+        image1, image2, difference, abs_difference, image1.size,
+        ctypes.byref(total), ctypes.byref(maximum)
+    )
+    return total.value, maximum.value, image1.size
+
+def _aot_supports(image1, image2, difference, abs_difference):
+    """
+    Whether the arrays match one of the fixed signatures of the ahead-of-time kernels
+    """
+    arrays = (image1, image2, difference, abs_difference)
+    if image1.ndim != 2 or not all(array.flags.c_contiguous for array in arrays):
+        return False
+    if image1.dtype == image2.dtype == np.uint16:
+        return difference.dtype == abs_difference.dtype == np.int32
+    if image1.dtype == image2.dtype == np.float32:
+        return difference.dtype == abs_difference.dtype == np.float32
+    return False
+
+def _diff_stats_aot(image1, image2, difference, abs_difference):
+    """
+    Ahead-of-time compiled version of _diff_stats for uint16 and float32 rasters
+    """
+    kernel = _diff_u16_aot if image1.dtype == np.uint16 else _diff_f32_aot
+    total, maximum = kernel(image1, image2, difference, abs_difference)
+    return float(total), float(maximum), image1.size
+
+def _fused_kernel_available(dtypes):
+    """
+    Whether one of the compiled _diff_stats kernels handles rasters of these dtypes,
+    numba takes any dtype, the ahead-of-time kernels uint16 and float32 and the
+    C library float32, which _compare_arrays casts to whenever it is exact
+    """
+    if NUMBA_AVAILABLE:
+        return True
+    if _difference_dtype(*dtypes) == np.float32:
+        return AOT_AVAILABLE or _diffstats_lib is not None
+    return AOT_AVAILABLE and all(np.dtype(dtype) == np.uint16 for dtype in dtypes)
+
+def _diff_stats(image1, image2, difference, abs_difference):
+    """
+    Fill difference with image2 - image1 and abs_difference with its absolute value
+    Returns the total and maximum absolute difference as floats and the number of pixels,
+    on every backend a NaN pixel makes the total and the maximum NaN like numpy does
+    Uses numba when installed, then the ahead-of-time kernels or the C library
+    when built, then numpy, see _compare_records_gpu for the CUDA version
+    """
+    # The compiled kernels work on rows, so the bands of a (bands, height, width)
+    # image are stacked into one taller raster, the outputs are reshaped as views
+    if image1.ndim > 2:
+        image1, image2, difference, abs_difference = (
+            array.reshape(-1, array.shape[-1])
+            for array in (image1, image2, difference, abs_difference)
+        )
+    
+    if NUMBA_AVAILABLE and image1.ndim == 2:
+        return _diff_stats_numba(image1, image2, difference, abs_difference)
+    if AOT_AVAILABLE and _aot_supports(image1, image2, difference, abs_difference):
+        return _diff_stats_aot(image1, image2, difference, abs_difference)
+    if (_diffstats_lib is not None
+            and image1.flags.c_contiguous and image2.flags.c_contiguous
+            and image1.dtype == image2.dtype == np.float32):
+        return _diff_stats_c(image1, image2, difference, abs_difference)
+    return _diff_stats_numpy(image1, image2, difference, abs_difference)
+
+def _array_module(array):
+    """
+    numpy, or cupy for arrays that live on a CUDA device
+    """
+    return cupy.get_array_module(array) if CUPY_AVAILABLE else np
+
+def _as_numpy(array):
+    """
+    Host copy of a device array, host arrays are returned as they are
+    """
+    return cupy.asnumpy(array) if _array_module(array) is not np else array
+
+@dataclass(eq=False)
+class DiffResult:
+    """
+    Results of comparing two images of consecutive dates
+    The full raster percentage_change is only computed the first time it is accessed
+    difference and abs_difference are numpy arrays, or np.memmap arrays when they come
+    from worker processes, with compare_images(..., keep_on_device=True) on a GPU
+    they and percentage_change are CuPy arrays, cupy.asnumpy copies them to the host
+    Results compare by identity, comparing the rasters element-wise is left to the caller
+    """
+    date1: str
+    date2: str
+    difference: 'np.ndarray | cupy.ndarray'
+    abs_difference: 'np.ndarray | cupy.ndarray'
+    total_difference: float
+    mean_difference: float
+    max_difference: float
+    load_image1: Callable[[], np.ndarray] = field(default=None, repr=False, compare=False)
+    
+    @cached_property
+    def percentage_change(self):
+        """
+        Change relative to the first image in percent
+        """
+        xp = _array_module(self.difference)
+        image1 = xp.asarray(self.load_image1()).astype(np.float32, copy=False)
+        
+        # Calculate percentage change, reusing one buffer for every step
+        # Avoid division by zero
+        epsilon = np.float32(1e-10)  # Small value to avoid division by zero
+        percentage_change = xp.add(image1, epsilon)
+        xp.divide(self.difference, percentage_change, out=percentage_change)
+        percentage_change *= 100
+        
+        # The first image is not needed any more
+        self.load_image1 = None
+        return percentage_change
+
+def _warn_shape_mismatch(date1, date2, shape1, shape2):
+    """
+    Report a pair of images that cannot be compared
+    """
+    print(f"Warning: Images for {date1} and {date2} have different shapes")
+    print(f"Shape of {date1}: {shape1}")
+    print(f"Shape of {date2}: {shape2}")
+
+def _difference_dtype(*dtypes):
+    """
+    dtype the differences of rasters with the given dtypes are computed in
+    Integer rasters up to 16 bit (e.g. uint16 reflectance) are differenced exactly
+    in int32 and 32 bit ones in int64, rasters that float32 holds exactly in
+    float32, everything else in float64 so no backend can overflow or round
+    """
+    dtypes = [np.dtype(dtype) for dtype in dtypes]
+    if all(dtype.kind in 'iu' for dtype in dtypes):
+        itemsize = max(dtype.itemsize for dtype in dtypes)
+        if itemsize <= 2:
+            return np.dtype(np.int32)
+        if itemsize <= 4:
+            return np.dtype(np.int64)
+    elif all(np.can_cast(dtype, np.float32) for dtype in dtypes):
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
+
+def _compare_arrays(date1, date2, image1, image2):
+    """
+    Compare two images of consecutive dates
+    Returns the comparison values, or None if the images have different shapes
+    """
+    # Check if images have the same dimensions
+    if image1.shape != image2.shape:
+        _warn_shape_mismatch(date1, date2, image1.shape, image2.shape)
+        return None
     
-    # Sort dates
-    dates = sorted(image_dict.keys())
+    # Integer rasters are read back through the integer output by the kernels,
+    # the rest is cast first, astype is a no-op when the dtype already matches
+    diff_dtype = _difference_dtype(image1.dtype, image2.dtype)
+    if diff_dtype.kind == 'f':
+        image1 = image1.astype(diff_dtype, copy=False)
+        image2 = image2.astype(diff_dtype, copy=False)
     
-    # Initialize results dictionary
-    results = {}
+    # Calculate simple and absolute difference together with the
+    # total and maximum change in a single pass
+    difference = np.empty(image1.shape, dtype=diff_dtype)
+    abs_difference = np.empty_like(difference)
+    total_difference, max_difference, pixel_count = _diff_stats(
+        image1, image2, difference, abs_difference
+    )
     
-    # Compare each image with the next one in chronological order
-    for i in range(len(dates) - 1):
-        date1 = dates[i]
-        date2 = dates[i + 1]
-        
-        image1 = image_dict[date1]['data']
-        image2 = image_dict[date2]['data']
-        
-        # Check if images have the same dimensions
-        if image1.shape != image2.shape:
-            print(f"Warning: Images for {date1} and {date2} have different shapes")
-            print(f"Shape of {date1}: {image1.shape}")
-            print(f"Shape of {date2}: {image2.shape}")
+    # Calculate total change metrics
+    mean_difference = total_difference / pixel_count
+    
+    return {
+        'difference': difference,
+        'abs_difference': abs_difference,
+        'total_difference': total_difference,
+        'mean_difference': mean_difference,
+        'max_difference': max_difference,
+        'date1': date1,
+        'date2': date2
+    }
+
+def _init_compare_worker():
+    """
+    Worker process initializer, the pool already runs one pair per CPU so the
+    numba kernels must not start a thread per CPU on top of that
+    """
+    if NUMBA_AVAILABLE:
+        set_num_threads(1)
+
+def _compare_pair(record1, record2, output_dir):
+    """
+    Read and compare the images of two records from iter_images_sorted
+    Top level so it can run in a worker process, each worker reads its own files
+    The difference rasters are saved as .npy files in output_dir instead of being
+    pickled back to the parent, only their paths and the scalars are returned
+    """
+    image1 = _read_image_data(record1.path, record1.metadata)
+    image2 = _read_image_data(record2.path, record2.metadata)
+    values = _compare_arrays(
+        record1.date.strftime('%Y-%m-%d'), record2.date.strftime('%Y-%m-%d'), image1, image2
+    )
+    if values is None:
+        return None
+    
+    for key in ('difference', 'abs_difference'):
+        array_file = os.path.join(output_dir, f"{values['date1']}_to_{values['date2']}.{key}.npy")
+        np.save(array_file, values[key])
+        values[key] = array_file
+    return values
+
+def _load_worker_arrays(values):
+    """
+    Memory-map the arrays _compare_pair saved for one comparison
+    Copy-on-write so the results stay writable, on POSIX the mappings outlive
+    the removal of the temporary directory
+    """
+    for key in ('difference', 'abs_difference'):
+        values[key] = np.load(values[key], mmap_mode='c')
+    return values
+
+def _print_comparison(result):
+    """
+    Print the change metrics of one comparison
+    """
+    print(f"Comparison from {result['date1']} to {result['date2']}:")
+    print(f"  Total absolute change: {result['total_difference']}")
+    print(f"  Mean absolute change: {result['mean_difference']}")
+    print(f"  Maximum absolute change: {result['max_difference']}")
+
+def _compare_records_parallel(records, max_workers=None):
+    """
+    Compare consecutive records from iter_images_sorted in worker processes
+    Returns the comparison values in chronological order, the difference rasters
+    are memory maps of files the workers wrote to a temporary directory
+    """
+    # The headers already give the shapes, so pairs that cannot be compared
+    # are dropped before any pixels are read
+    pairs = []
+    for record1, record2 in zip(records, records[1:]):
+        shape1 = _record_shape(record1)
+        shape2 = _record_shape(record2)
+        if shape1 != shape2:
+            _warn_shape_mismatch(
+                record1.date.strftime('%Y-%m-%d'), record2.date.strftime('%Y-%m-%d'), shape1, shape2
+            )
+            continue
+        pairs.append((record1, record2))
+    compared = [None] * len(pairs)
+    
+    # Every array is mapped before the directory is removed, so nothing is left
+    # behind when a worker fails half way or the caller stops iterating early,
+    # ignore_errors covers Windows, which cannot remove mapped files
+    output_dir = tempfile.mkdtemp(prefix='compare_images_')
+    try:
+        # Forking after numba or GDAL have started their threads can deadlock
+        # the workers, so always start them fresh
+        with ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=get_context('spawn'), initializer=_init_compare_worker
+        ) as executor:
+            futures = {
+                executor.submit(_compare_pair, record1, record2, output_dir): i
+                for i, (record1, record2) in enumerate(pairs)
+            }
+            
+            for future in as_completed(futures):
+                i = futures[future]
+                record1, record2 = pairs[i]
+                try:
+                    values = future.result()
+                    if values is not None:
+                        compared[i] = _load_worker_arrays(values)
+                except Exception as e:
+                    print(f"Error comparing {record1.path} and {record2.path}: {e}")
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    
+    for (record1, _), values in zip(pairs, compared):
+        if values is not None:
+            yield values, partial(_read_image_data, record1.path, record1.metadata)
+
+def _compare_records_streaming(records):
+    """
+    Compare consecutive records in the calling process
+    Only the previous image is kept while the next one is read
+    """
+    previous = None
+    for date2, image2, reload2 in _iter_image_data(records):
+        if image2 is None:
+            # Skipped for its shape, so neither of its pairs is compared
+            previous = None
             continue
         
-        # Calculate simple difference
-        difference = image2.astype(float) - image1.astype(float)
+        if previous is None:
+            previous = date2, image2, reload2
+            continue
         
-        # Calculate absolute difference
-        abs_difference = np.abs(difference)
+        date1, image1, reload1 = previous
+        previous = date2, image2, reload2
         
-        # Calculate percentage change
-        # Avoid division by zero
-        epsilon = 1e-10  # Small value to avoid division by zero
-        percentage_change = (difference / (image1.astype(float) + epsilon)) * 100
+        values = _compare_arrays(date1, date2, image1, image2)
+        if values is not None:
+            yield values, reload1
+
+def _upload_image(image, stream):
+    """
+    Start copying an image to the device on stream
+    The copy goes through pinned host memory so it runs asynchronously,
+    returns the device array, an event that fires once it is complete and
+    the pinned buffer, which has to be kept alive until then
+    """
+    pinned = cupyx.empty_pinned(image.shape, dtype=image.dtype)
+    pinned[...] = image
+    device = cupy.empty(image.shape, dtype=image.dtype)
+    device.set(pinned, stream=stream)
+    return device, stream.record(), pinned
+
+def _compare_records_gpu(records, keep_on_device=False):
+    """
+    Compare consecutive records on a CUDA device
+    Every image is uploaded once, the next one is copied on its own stream while
+    the current pair is differenced and its difference rasters are copied back,
+    with keep_on_device they stay on the device instead, two rasters per period
+    """
+    copy_stream = cupy.cuda.Stream(non_blocking=True)
+    compute_stream = cupy.cuda.Stream(non_blocking=True)
+    
+    # (date, device image, upload event, pinned buffer, reload function)
+    previous = None
+    current = None
+    
+    def compare(previous, current):
+        date1, device1, _, _, reload1 = previous
+        date2, device2, event2, _, _ = current
+        if device1.shape != device2.shape:
+            _warn_shape_mismatch(date1, date2, device1.shape, device2.shape)
+            return None
+        
+        diff_dtype = _difference_dtype(device1.dtype, device2.dtype)
         
-        # Calculate total change metrics
-        total_difference = np.sum(abs_difference)
-        mean_difference = np.mean(abs_difference)
-        max_difference = np.max(abs_difference)
+        compute_stream.wait_event(event2)
+        with compute_stream:
+            difference = cupy.subtract(device2, device1, dtype=diff_dtype)
+            abs_difference = cupy.abs(difference)
+            total = abs_difference.sum(dtype=cupy.float64)
+            maximum = abs_difference.max()
+            if not keep_on_device:
+                # Queued behind the kernels, so this overlaps the next upload
+                difference = difference.get(stream=compute_stream)
+                abs_difference = abs_difference.get(stream=compute_stream)
+        compute_stream.synchronize()
         
-        # Store results
-        results[f"{date1}_to_{date2}"] = {
+        total_difference = float(total.get())
+        values = {
             'difference': difference,
             'abs_difference': abs_difference,
-            'percentage_change': percentage_change,
             'total_difference': total_difference,
-            'mean_difference': mean_difference,
-            'max_difference': max_difference,
+            'mean_difference': total_difference / difference.size,
+            'max_difference': float(maximum.get()),
             'date1': date1,
             'date2': date2
         }
+        return values, reload1
+    
+    for date2, image2, reload2 in _iter_image_data(records):
+        # Queue the upload first so it overlaps the pair computed below,
+        # images skipped for their shape are never uploaded
+        upload = None
+        if image2 is not None:
+            upload = (date2,) + _upload_image(image2, copy_stream) + (reload2,)
+        
+        if previous is not None and current is not None:
+            compared = compare(previous, current)
+            if compared is not None:
+                yield compared
         
-        print(f"Comparison from {date1} to {date2}:")
-        print(f"  Total absolute change: {total_difference}")
-        print(f"  Mean absolute change: {mean_difference}")
-        print(f"  Maximum absolute change: {max_difference}")
+        previous, current = current, upload
+    
+    if previous is not None and current is not None:
+        compared = compare(previous, current)
+        if compared is not None:
+            yield compared
+
+def _compare_records_stacked(records, block_size=16):
+    """
+    Compare consecutive in-memory records of a single shape over the whole stack
+    np.diff along the date axis replaces the per pair loop, dates are processed in
+    blocks of block_size so only that many extra rasters are allocated at once
+    """
+    stack_dtype = _difference_dtype(*(record.data.dtype for record in records))
+    
+    for start in range(0, len(records) - 1, block_size):
+        # Blocks overlap by one date so every consecutive pair is covered
+        block = records[start:start + block_size + 1]
+        stack = np.empty((len(block),) + block[0].data.shape, dtype=stack_dtype)
+        for i, record in enumerate(block):
+            stack[i] = record.data
+        
+        differences = np.diff(stack, axis=0)
+        abs_differences = np.abs(differences)
+        image_axes = tuple(range(1, stack.ndim))
+        totals = abs_differences.sum(axis=image_axes, dtype=np.float64)
+        maxima = abs_differences.max(axis=image_axes)
+        pixel_count = stack[0].size
+        
+        for k in range(len(block) - 1):
+            values = {
+                'difference': differences[k],
+                'abs_difference': abs_differences[k],
+                'total_difference': float(totals[k]),
+                'mean_difference': float(totals[k]) / pixel_count,
+                'max_difference': float(maxima[k]),
+                'date1': block[k].date.strftime('%Y-%m-%d'),
+                'date2': block[k + 1].date.strftime('%Y-%m-%d')
+            }
+            yield values, lambda image_data=block[k].data: image_data
+
+def compare_images(images, parallel=False, max_workers=None, keep_on_device=False, verbose=True):
+    """
+    Compare loaded images to detect changes over time
+    images are the date sorted records from load_images_from_directory, or the
+    records from iter_images_sorted, which keeps only two images in memory per
+    comparison, with parallel set they are compared in worker processes instead
+    The workers are spawned, so scripts that set parallel need an
+    if __name__ == "__main__" guard, it only pays off without numba as the
+    numba kernels already use every CPU
+    On a GPU the difference rasters are copied back to the host unless
+    keep_on_device is set, which saves the copies but keeps every period in
+    device memory, so only use it when the whole series fits there
+    The metrics of every comparison are printed unless verbose is False
+    """
+    images = list(images)
+    
+    if len(images) < 2:
+        print("Need at least two images to compare")
+        return
+    
+    # Initialize results dictionary
+    results = {}
+    
+    # Compare each image with the next one in chronological order
+    # With a GPU the pairs stay in this process so every image is uploaded once.
+    # Loaded images of one shape are differenced as a single stack when no
+    # compiled kernel is available to fuse the per pair work instead
+    in_memory = all(record.data is not None for record in images)
+    if CUPY_AVAILABLE:
+        compared = _compare_records_gpu(images, keep_on_device)
+    elif (parallel and len(images) > 2
+            and all(record.data is None for record in images)):
+        compared = _compare_records_parallel(images, max_workers)
+    elif (in_memory and len({record.data.shape for record in images}) == 1
+            and not _fused_kernel_available({record.data.dtype for record in images})):
+        compared = _compare_records_stacked(images)
+    else:
+        compared = _compare_records_streaming(images)
+    
+    for values, load_image1 in compared:
+        # Store results, percentage_change is computed on first access
+        results[f"{values['date1']}_to_{values['date2']}"] = DiffResult(
+            **values, load_image1=load_image1
+        )
+        if verbose:
+            _print_comparison(values)
     
     return results
 
-def visualize_changes(results, output_dir=None):
+def _build_change_figure(fig, shape):
+    """
+    Create the three change panels and their colorbars on an empty figure
+    Returns the difference, absolute difference and significant change images
+    """
+    axes = fig.subplots(1, 3)
+    placeholder = np.zeros(shape, dtype=np.float32)
+    
+    # Plot difference
+    im1 = axes[0].imshow(placeholder, cmap='RdBu', vmin=-500, vmax=500)
+    fig.colorbar(im1, ax=axes[0], label='Pixel value difference')
+    
+    # Plot absolute difference
+    im2 = axes[1].imshow(placeholder, cmap='hot', vmin=0, vmax=500)
+    fig.colorbar(im2, ax=axes[1], label='Absolute pixel value difference')
+    
+    # Plot thresholded difference to highlight significant changes
+    # The colour limits follow each period's maximum, see set_clim below
+    im3 = axes[2].imshow(placeholder, cmap='hot')
+    fig.colorbar(im3, ax=axes[2], label='Changes above threshold')
+    
+    return im1, im2, im3
+
+def visualize_changes(results, output_dir=None, show=False):
     """
     Visualize the detected changes
+    Figures are only shown interactively when show is set or there is no output_dir,
+    otherwise they are rendered into a single figure whose panels and colorbars
+    are built once and only get new data for every period, that figure is
+    created outside of pyplot so the caller's backend is left alone
     """
     if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
+    interactive = show or not output_dir
+    
+    fig = None
+    images = None
+    thresholded = None
     for period, data in results.items():
-        date1 = data['date1']
-        date2 = data['date2']
-        
-        # Create a figure with subplots for different visualizations
-        fig, axes = plt.subplots(1, 3, figsize=(18, 6))
-        
-        # Plot difference
-        im1 = axes[0].imshow(data['difference'][0], cmap='RdBu', vmin=-500, vmax=500)
-        axes[0].set_title(f'Raw Difference ({date1} to {date2})')
-        plt.colorbar(im1, ax=axes[0], label='Pixel value difference')
+        date1 = data.date1
+        date2 = data.date2
         
-        # Plot absolute difference
-        im2 = axes[1].imshow(data['abs_difference'][0], cmap='hot', vmin=0, vmax=500)
-        axes[1].set_title(f'Absolute Difference ({date1} to {date2})')
-        plt.colorbar(im2, ax=axes[1], label='Absolute pixel value difference')
+        # The first band is plotted, the threshold still follows the maximum over all bands
+        # Only the plotted band is copied from the GPU and cast to float,
+        # the results keep their dtype
+        difference = data.difference[0] if data.difference.ndim == 3 else data.difference
+        abs_difference = data.abs_difference[0] if data.abs_difference.ndim == 3 else data.abs_difference
+        difference = _as_numpy(difference).astype(np.float32, copy=False)
+        abs_difference = _as_numpy(abs_difference).astype(np.float32, copy=False)
         
-        # Plot thresholded difference to highlight significant changes
         # Threshold at 10% of the maximum difference
-        threshold = 0.1 * data['max_difference']
-        thresholded = np.copy(data['abs_difference'][0])
-        thresholded[thresholded < threshold] = 0
+        # The buffer is reused across periods, set_data copies it
+        threshold = 0.1 * data.max_difference
+        if thresholded is None or thresholded.shape != abs_difference.shape:
+            thresholded = np.empty(abs_difference.shape, dtype=np.float32)
+        np.multiply(abs_difference, abs_difference >= threshold, out=thresholded)
+        
+        # Create a figure with subplots for different visualizations
+        # Shown figures are closed by the user, so they are rebuilt every time,
+        # a saved figure is only rebuilt when the raster shape changes
+        rebuild = interactive or images is None or images[0].get_array().shape != difference.shape
+        if rebuild:
+            if interactive:
+                fig = plt.figure(figsize=(18, 6))
+            elif fig is None:
+                # Only saving to files, a figure without a GUI canvas is enough
+                fig = Figure(figsize=(18, 6))
+            else:
+                fig.clf()
+            images = _build_change_figure(fig, difference.shape)
         
-        im3 = axes[2].imshow(thresholded, cmap='hot', vmin=0, vmax=data['max_difference'])
-        axes[2].set_title(f'Significant Changes ({date1} to {date2})')
-        plt.colorbar(im3, ax=axes[2], label='Changes above threshold')
+        im1, im2, im3 = images
+        im1.set_data(difference)
+        im1.axes.set_title(f'Raw Difference ({date1} to {date2})')
+        im2.set_data(abs_difference)
+        im2.axes.set_title(f'Absolute Difference ({date1} to {date2})')
+        im3.set_data(thresholded)
+        im3.set_clim(0, data.max_difference)
+        im3.axes.set_title(f'Significant Changes ({date1} to {date2})')
         
-        plt.tight_layout()
+        if rebuild:
+            fig.tight_layout()
         
         if output_dir:
-            plt.savefig(os.path.join(output_dir, f"change_{date1}_to_{date2}.png"), dpi=300)
+            fig.savefig(os.path.join(output_dir, f"change_{date1}_to_{date2}.png"), dpi=150)
             print(f"Saved visualization to {os.path.join(output_dir, f'change_{date1}_to_{date2}.png')}")
         
-        plt.show()
+        if interactive:
+            plt.show()
+
+def _pos_neg_sum_numpy(difference):
+    """
+    Plain numpy fallback for _pos_neg_sum, no boolean-mask copies
+    fmax and fmin turn NaN pixels into 0, so they are skipped like the masks did
+    Device arrays are reduced on the GPU with the same calls through cupy
+    """
+    xp = _array_module(difference)
+    positive = xp.fmax(difference, 0).sum(dtype=np.float64)
+    negative = -xp.fmin(difference, 0).sum(dtype=np.float64)
+    return float(positive), float(negative)
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=_FASTMATH, cache=True)
+    def _pos_neg_sum_numba(difference):
+        """
+        Accumulate positive and negative changes side by side in a single pass
+        Branchless row partials in the raster dtype, widened once per row
+        NaN pixels fail both comparisons and add nothing, as with the numpy version
+        """
+        rows, cols = difference.shape
+        zero = difference.dtype.type(0)
+        positive = 0.0
+        negative = 0.0
+        for i in prange(rows):
+            row_positive = zero
+            row_negative = zero
+            for j in range(cols):
+                d = difference[i, j]
+                row_positive += d if d > zero else zero
+                row_negative -= d if d < zero else zero
+            positive += row_positive
+            negative += row_negative
+        return positive, negative
+
+def _pos_neg_sum(difference):
+    """
+    Returns the sum of the positive values and the (positive) sum of the negative values
+    """
+    # Bands of a (bands, height, width) difference are stacked into one taller raster
+    if NUMBA_AVAILABLE and isinstance(difference, np.ndarray) and difference.ndim >= 2:
+        return _pos_neg_sum_numba(difference.reshape(-1, difference.shape[-1]))
+    return _pos_neg_sum_numpy(difference)
+
+def _pos_neg_sums_stacked(differences, block_size=16):
+    """
+    Per period positive and (positive) negative sums for differences of one shape
+    Periods are stacked into (block_size, ...) arrays and reduced in one call per block
+    """
+    positive = np.empty(len(differences))
+    negative = np.empty(len(differences))
+    
+    for start in range(0, len(differences), block_size):
+        block = np.stack(differences[start:start + block_size])
+        image_axes = tuple(range(1, block.ndim))
+        positive[start:start + block_size] = np.fmax(block, 0).sum(axis=image_axes, dtype=np.float64)
+        negative[start:start + block_size] = -np.fmin(block, 0).sum(axis=image_axes, dtype=np.float64)
+    
+    return list(zip(positive.tolist(), negative.tolist()))
 
 def estimate_volume_changes(results, pixel_area=100):  # pixel_area in square meters (10m x 10m for Sentinel-2)
     """
@@ -198,21 +1031,27 @@ def estimate_volume_changes(results, pixel_area=100):  # pixel_area in square me
     """
     volume_estimates = {}
     
-    for period, data in results.items():
-        difference = data['difference']
-        
-        # Assuming pixel values correspond to elevation changes in meters
-        # This is a major assumption and would need calibration with ground truth data
-        # Negative values indicate material removal, positive values indicate material addition
-        
-        # Calculate volume change per pixel (pixel area × height change)
-        volume_change_per_pixel = difference * pixel_area
-        
+    # Assuming pixel values correspond to elevation changes in meters
+    # This is a major assumption and would need calibration with ground truth data
+    # Negative values indicate material removal, positive values indicate material addition
+    
+    # Volume change per pixel is pixel area × height change, so sum the
+    # height changes first and scale once instead of per pixel
+    # Without numba the periods of one shape are reduced together as a stack,
+    # differences that are still on the GPU are reduced there one by one
+    differences = [data.difference for data in results.values()]
+    if (not NUMBA_AVAILABLE and differences and len({d.shape for d in differences}) == 1
+            and all(isinstance(d, np.ndarray) for d in differences)):
+        height_changes = _pos_neg_sums_stacked(differences)
+    else:
+        height_changes = [_pos_neg_sum(difference) for difference in differences]
+    
+    for period, (height_added, height_removed) in zip(results, height_changes):
         # Sum up all negative changes (material removed)
-        material_removed = -np.sum(volume_change_per_pixel[volume_change_per_pixel < 0])
+        material_removed = height_removed * pixel_area
         
         # Sum up all positive changes (material added)
-        material_added = np.sum(volume_change_per_pixel[volume_change_per_pixel > 0])
+        material_added = height_added * pixel_area
         
         # Net change
         net_change = material_added - material_removed
@@ -231,6 +1070,14 @@ def estimate_volume_changes(results, pixel_area=100):  # pixel_area in square me
     return volume_estimates
 
 def main():
+    parser = argparse.ArgumentParser(description="Detect changes between satellite images")
+    parser.add_argument('--show', action='store_true', help="Show the change figures interactively")
+    parser.add_argument(
+        '--cache', action='store_true',
+        help="Keep an uncompressed .npy copy of every TIFF next to it for faster later runs"
+    )
+    args = parser.parse_args()
+    
     # Path to your satellite images
     data_dir = "/Users/user/Desktop/satellite-inference/data/raw"
     
@@ -239,9 +1086,15 @@ def main():
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
+    # Resolution reduction used for the visualizations only
+    preview_decimation = 4
+    
     # Load images
+    # Only the headers are read here, compare_images streams the pixels
+    # With --cache the decoded pixels are also written into data_dir, one
+    # uncompressed .npy file per TIFF, so only use it where that space is available
     print("Loading images...")
-    images = load_images_from_directory(data_dir)
+    images = list(iter_images_sorted(data_dir, cache=args.cache))
     
     if len(images) < 2:
         print("Need at least two images for comparison")
@@ -249,11 +1102,17 @@ def main():
     
     # Compare images
     print("\nComparing images...")
-    results = compare_images(images)
+    # The numba kernels already use every core, worker processes only help without them
+    results = compare_images(images, parallel=not NUMBA_AVAILABLE)
     
     # Visualize changes
-    print("\nVisualizing changes...")
-    visualize_changes(results, output_dir)
+    # The figures are a few thousand pixels wide, so compare decimated reads
+    # for them rather than the full resolution rasters, only the first band is plotted
+    # Their metrics differ from the full resolution ones above, so they are not printed
+    print(f"\nVisualizing changes (previews at 1/{preview_decimation} resolution)...")
+    preview_images = iter_images_sorted(data_dir, decimation=preview_decimation)
+    preview_results = compare_images(preview_images, verbose=False)
+    visualize_changes(preview_results, output_dir, show=args.show)
     
     # Estimate volume changes
     # Note: This is highly simplified and would need calibration
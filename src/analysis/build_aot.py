@@ -0,0 +1,68 @@
+"""
+Ahead-of-time build of the fused difference kernel with numba.pycc
+Run once from the repository root:
+    python src/analysis/build_aot.py
+This writes the diffstats_aot extension next to this file, src.analysis imports it
+when present so the kernel needs neither numba nor a JIT warm-up at run time
+numba.pycc has been pending deprecation since numba 0.57 and numba 0.68 raises
+NumbaPendingDeprecationWarning on import, so this build path ends with a future
+numba release, the JIT kernels in __init__.py remain the supported route
+"""
+
+import os
+
+import numpy as np
+from numba.pycc import CC
+
+cc = CC('diffstats_aot')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+@cc.export('diff_u16', 'Tuple((f8, i4))(u2[:, ::1], u2[:, ::1], i4[:, ::1], i4[:, ::1])')
+def diff_u16(image1, image2, difference, abs_difference):
+    """
+    Fused difference of two uint16 rasters into int32 buffers
+    Returns the total and maximum absolute difference
+    """
+    rows, cols = image1.shape
+    total = 0.0
+    maximum = np.int32(0)
+    for i in range(rows):
+        row_total = 0
+        for j in range(cols):
+            d = np.int32(image2[i, j]) - np.int32(image1[i, j])
+            difference[i, j] = d
+            ad = abs(d)
+            abs_difference[i, j] = ad
+            row_total += ad
+            maximum = max(maximum, ad)
+        total += row_total
+    return total, maximum
+
+
+@cc.export('diff_f32', 'Tuple((f8, f4))(f4[:, ::1], f4[:, ::1], f4[:, ::1], f4[:, ::1])')
+def diff_f32(image1, image2, difference, abs_difference):
+    """
+    Fused difference of two float32 rasters into float32 buffers
+    Returns the total and maximum absolute difference
+    """
+    rows, cols = image1.shape
+    total = 0.0
+    maximum = np.float32(0)
+    for i in range(rows):
+        row_total = np.float32(0)
+        for j in range(cols):
+            d = image2[i, j] - image1[i, j]
+            difference[i, j] = d
+            ad = abs(d)
+            abs_difference[i, j] = ad
+            row_total += ad
+            # Propagate NaN like numpy, the builtin max would skip it
+            if ad > maximum or ad != ad:
+                maximum = ad
+        total += row_total
+    return total, maximum
+
+
+if __name__ == "__main__":
+    cc.compile()
@@ -0,0 +1,78 @@
+/*
+ * Fused difference statistics for compare_images, used when numba is not installed
+ * Computes b - a, |b - a|, the total and the maximum of |b - a| in a single pass
+ *
+ * Build next to this file, it is loaded with ctypes when present:
+ *   cc -O3 -mavx2 -shared -fPIC -o src/analysis/libdiffstats.so src/analysis/diffstats.c
+ * Without -mavx2 only the scalar loop is compiled
+ * A NaN pixel makes the maximum NaN, as with numpy
+ */
+
+#include <math.h>
+#include <stddef.h>
+
+#ifdef __AVX2__
+#include <immintrin.h>
+#endif
+
+void diffstats(const float *a, const float *b, float *out_diff, float *out_abs,
+               size_t n, double *total, float *maxv)
+{
+    size_t i = 0;
+    double sum = 0.0;
+    float mx = 0.0f;
+
+#ifdef __AVX2__
+    /* Clearing the sign bit is the absolute value */
+    const __m256 sign = _mm256_set1_ps(-0.0f);
+    __m256d sum_lo = _mm256_setzero_pd();
+    __m256d sum_hi = _mm256_setzero_pd();
+    __m256 vmax = _mm256_setzero_ps();
+    __m256 vnan = _mm256_setzero_ps();
+    double sums[4];
+    float maxes[8];
+    int k;
+
+    for (; i + 8 <= n; i += 8) {
+        __m256 d = _mm256_sub_ps(_mm256_loadu_ps(b + i), _mm256_loadu_ps(a + i));
+        __m256 ad = _mm256_andnot_ps(sign, d);
+        _mm256_storeu_ps(out_diff + i, d);
+        _mm256_storeu_ps(out_abs + i, ad);
+
+        /* Accumulate in double so large rasters do not lose precision */
+        sum_lo = _mm256_add_pd(sum_lo, _mm256_cvtps_pd(_mm256_castps256_ps128(ad)));
+        sum_hi = _mm256_add_pd(sum_hi, _mm256_cvtps_pd(_mm256_extractf128_ps(ad, 1)));
+        /* max_ps drops a NaN in its first operand, so NaN lanes are tracked separately */
+        vmax = _mm256_max_ps(vmax, ad);
+        vnan = _mm256_or_ps(vnan, _mm256_cmp_ps(ad, ad, _CMP_UNORD_Q));
+    }
+
+    _mm256_storeu_pd(sums, _mm256_add_pd(sum_lo, sum_hi));
+    sum = sums[0] + sums[1] + sums[2] + sums[3];
+
+    _mm256_storeu_ps(maxes, vmax);
+    for (k = 0; k < 8; k++) {
+        if (maxes[k] > mx) {
+            mx = maxes[k];
+        }
+    }
+    if (_mm256_movemask_ps(vnan)) {
+        mx = NAN;
+    }
+#endif
+
+    /* Remaining pixels, or all of them without AVX2 */
+    for (; i < n; i++) {
+        float d = b[i] - a[i];
+        float ad = d < 0.0f ? -d : d;
+        out_diff[i] = d;
+        out_abs[i] = ad;
+        sum += ad;
+        if (ad > mx || ad != ad) {
+            mx = ad;
+        }
+    }
+
+    *total = sum;
+    *maxv = mx;
+}
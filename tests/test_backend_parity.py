@@ -0,0 +1,142 @@
+"""
+Parity of the difference and volume backends in src.analysis
+Every available kernel and compare path is checked against a float64 reference
+Run from the repository root:
+    python -m unittest tests.test_backend_parity
+"""
+
+import contextlib
+import io
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+import src.analysis as analysis
+from src.analysis import ImageRecord
+
+
+def _inputs():
+    """
+    Named pairs of (bands, height, width) rasters, odd widths so the AVX2 tail runs too
+    """
+    rng = np.random.default_rng(0)
+    shape = (3, 37, 41)
+
+    uint16 = rng.integers(0, 10000, size=(2,) + shape, dtype=np.uint16)
+
+    float32 = rng.random((2,) + shape, dtype=np.float32)
+    float32_nan = float32.copy()
+    float32_nan[1, 1, 5, 7] = np.nan
+
+    return {
+        'uint16': (uint16[0], uint16[1]),
+        'float32': (float32[0], float32[1]),
+        'float32_nan': (float32_nan[0], float32_nan[1]),
+    }
+
+def _reference(image1, image2):
+    """
+    Difference, total and maximum in float64, NaN propagates as in numpy
+    """
+    difference = image2.astype(np.float64) - image1.astype(np.float64)
+    abs_difference = np.abs(difference)
+    return difference, float(abs_difference.sum()), float(abs_difference.max())
+
+def _kernels():
+    """
+    The _diff_stats backends available here with the dtypes they accept
+    """
+    kernels = [('numpy', analysis._diff_stats_numpy, lambda *arrays: True)]
+    if analysis.NUMBA_AVAILABLE:
+        kernels.append(('numba', analysis._diff_stats_numba, lambda *arrays: True))
+    if analysis.AOT_AVAILABLE:
+        kernels.append(('aot', analysis._diff_stats_aot, analysis._aot_supports))
+    if analysis._diffstats_lib is not None:
+        kernels.append((
+            'c', analysis._diff_stats_c,
+            lambda image1, image2, *outputs: image1.dtype == image2.dtype == np.float32
+        ))
+    return kernels
+
+
+class DiffStatsParityTest(unittest.TestCase):
+    def assertMatchesReference(self, image1, image2, difference, total, maximum):
+        ref_difference, ref_total, ref_maximum = _reference(image1, image2)
+        np.testing.assert_allclose(difference, ref_difference, rtol=1e-6, atol=1e-6)
+        self.assertIsInstance(total, float)
+        self.assertIsInstance(maximum, float)
+        if np.isnan(ref_maximum):
+            self.assertTrue(np.isnan(total))
+            self.assertTrue(np.isnan(maximum))
+        else:
+            self.assertAlmostEqual(total, ref_total, delta=1e-6 * ref_total)
+            self.assertAlmostEqual(maximum, ref_maximum, delta=1e-6 * ref_maximum)
+
+    def test_kernels(self):
+        for name, kernel, supports in _kernels():
+            for input_name, (image1, image2) in _inputs().items():
+                with self.subTest(kernel=name, input=input_name):
+                    diff_dtype = analysis._difference_dtype(image1.dtype, image2.dtype)
+                    # The kernels see the bands stacked into rows, as in _diff_stats
+                    arrays = [
+                        np.ascontiguousarray(array).reshape(-1, array.shape[-1])
+                        for array in (image1, image2, np.empty(image1.shape, diff_dtype),
+                                      np.empty(image1.shape, diff_dtype))
+                    ]
+                    if not supports(*arrays):
+                        self.skipTest(f"{name} does not take {input_name}")
+                    total, maximum, count = kernel(*arrays)
+                    self.assertEqual(count, image1.size)
+                    self.assertMatchesReference(
+                        image1, image2, arrays[2].reshape(image1.shape), total, maximum
+                    )
+
+    def test_compare_paths(self):
+        # The process pool needs files and the GPU path a device, so only the
+        # in-process paths are checked here
+        paths = {
+            'streaming': analysis._compare_records_streaming,
+            'stacked': analysis._compare_records_stacked,
+        }
+        for path, compare in paths.items():
+            for input_name, (image1, image2) in _inputs().items():
+                with self.subTest(path=path, input=input_name):
+                    records = [
+                        ImageRecord(datetime(2024, 1, 1), 'a.tif', image1, {}),
+                        ImageRecord(datetime(2024, 1, 2), 'b.tif', image2, {}),
+                    ]
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        (values, _), = compare(records)
+                    self.assertMatchesReference(
+                        image1, image2, values['difference'],
+                        values['total_difference'], values['max_difference']
+                    )
+
+
+class VolumeSumParityTest(unittest.TestCase):
+    def test_pos_neg_sums(self):
+        for input_name, (image1, image2) in _inputs().items():
+            difference = image2.astype(np.float64) - image1.astype(np.float64)
+            # NaN pixels are skipped, as with the boolean masks of the original code
+            reference = (
+                float(difference[difference > 0].sum()), float(-difference[difference < 0].sum())
+            )
+            diff_dtype = analysis._difference_dtype(image1.dtype, image2.dtype)
+            difference = difference.astype(diff_dtype)
+
+            sums = {
+                'numpy': analysis._pos_neg_sum_numpy(difference),
+                'stacked': analysis._pos_neg_sums_stacked([difference])[0],
+            }
+            if analysis.NUMBA_AVAILABLE:
+                sums['numba'] = analysis._pos_neg_sum(difference)
+
+            for name, (positive, negative) in sums.items():
+                with self.subTest(backend=name, input=input_name):
+                    self.assertAlmostEqual(positive, reference[0], delta=1e-5 * reference[0])
+                    self.assertAlmostEqual(negative, reference[1], delta=1e-5 * reference[1])
+
+
+if __name__ == "__main__":
+    unittest.main()